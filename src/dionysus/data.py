@@ -0,0 +1,147 @@
+import logging
+
+import torch
+from torch.utils.data import DataLoader, RandomSampler, SequentialSampler
+
+from dionysus import utils
+
+
+class DeviceLoader:
+    """
+    Iterates over tensors that already live on the compute device and yields
+    batches by slicing, mirroring batch_size, shuffle and drop_last of the
+    DataLoader it replaces.
+    """
+
+    def __init__(self, x, y, batch_size=1, shuffle=False, drop_last=False):
+        self.x = x
+        self.y = y
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __len__(self):
+        n = len(self.x)
+        if self.drop_last:
+            return n // self.batch_size
+        return (n + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        n = len(self.x)
+        if self.shuffle:
+            indices = torch.randperm(n, device=self.x.device)
+        for i in range(len(self)):
+            start = i * self.batch_size
+            end = min(start + self.batch_size, n)
+            if self.shuffle:
+                idx = indices[start:end]
+                yield self.x[idx], self.y[idx]
+            else:
+                yield self.x[start:end], self.y[start:end]
+
+
+class CUDAPrefetcher:
+    """
+    Copies the next batch to the device on a side stream while the current
+    batch is processed.
+    """
+
+    def __init__(self, data_loader, device):
+        self.data_loader = data_loader
+        self.device = device
+        self.stream = torch.cuda.Stream(device=device)
+
+    def __len__(self):
+        return len(self.data_loader)
+
+    def __iter__(self):
+        self.iterator = iter(self.data_loader)
+        self.preload()
+        return self
+
+    def preload(self):
+        try:
+            next_x, next_y = next(self.iterator)
+        except StopIteration:
+            self.next_x = None
+            self.next_y = None
+            return
+        with torch.cuda.stream(self.stream):
+            self.next_x = utils.moveTo(next_x, self.device, non_blocking=True)
+            self.next_y = utils.moveTo(next_y, self.device, non_blocking=True)
+
+    def __next__(self):
+        if self.next_x is None:
+            raise StopIteration
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_stream(self.stream)
+        x, y = self.next_x, self.next_y
+        # memory allocated on the side stream must not be reused too early
+        for tensor in (x, y):
+            if isinstance(tensor, torch.Tensor):
+                tensor.record_stream(current_stream)
+        self.preload()
+        return x, y
+
+
+def preload(data_loader: DataLoader, device, max_bytes):
+    """
+    Materializes the whole dataset of data_loader on device once. Returns the
+    original loader if its sampler is not a plain sequential or random
+    sampler, if the batches are not (tensor, tensor) pairs, if the sample
+    shapes differ between batches (e.g. a collate_fn padding per batch) or
+    if the dataset is larger than max_bytes.
+    Random per-sample transforms of the dataset only run once, their output
+    is reused in every epoch.
+    """
+    if isinstance(data_loader, DeviceLoader) or data_loader.batch_size is None:
+        return data_loader
+
+    sampler = data_loader.sampler
+    # DeviceLoader can only reproduce a full pass, in order or shuffled
+    plain_random = (
+        type(sampler) is RandomSampler
+        and not sampler.replacement
+        and sampler._num_samples is None
+    )
+    if not (type(sampler) is SequentialSampler or plain_random):
+        logging.info(
+            f"dataset is not preloaded, {type(sampler).__name__} is not supported"
+        )
+        return data_loader
+
+    # iterate the dataset in order without dropping the last batch
+    ordered_loader = DataLoader(
+        data_loader.dataset,
+        batch_size=data_loader.batch_size,
+        collate_fn=data_loader.collate_fn,
+        num_workers=data_loader.num_workers,
+    )
+    xs, ys = [], []
+    n_bytes = 0
+    for batch in ordered_loader:
+        if len(batch) != 2 or not all(isinstance(t, torch.Tensor) for t in batch):
+            logging.info("dataset is not preloaded, batches are no tensor pairs")
+            return data_loader
+        x, y = batch
+        if xs and (x.shape[1:] != xs[0].shape[1:] or y.shape[1:] != ys[0].shape[1:]):
+            logging.info("dataset is not preloaded, sample shapes differ between batches")
+            return data_loader
+        n_bytes += x.element_size() * x.nelement() + y.element_size() * y.nelement()
+        if n_bytes > max_bytes:
+            logging.info(f"dataset is not preloaded, exceeds {max_bytes} bytes")
+            return data_loader
+        xs.append(x)
+        ys.append(y)
+
+    x = torch.cat(xs).to(device, non_blocking=True)
+    y = torch.cat(ys).to(device, non_blocking=True)
+    logging.info(f"preloaded {n_bytes / (1024 * 1024):.2f} MB to device {device}")
+
+    return DeviceLoader(
+        x,
+        y,
+        batch_size=data_loader.batch_size,
+        shuffle=plain_random,
+        drop_last=data_loader.drop_last,
+    )
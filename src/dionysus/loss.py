@@ -33,23 +33,36 @@ class DistillationLoss:
 
 class CrossEntropyLoss:
     """
-    Class is just used for testing.
+    Cross entropy over the last dimension of input, leading dimensions like
+    (batch, sequence) are flattened. target holds class indices or class
+    probabilities.
     """
 
-    def __init__(self, reduction="mean"):
-        if reduction == "mean":
-            self.reduction_func = torch.mean
-        elif reduction == "sum":
-            self.reduction_func = torch.sum
-        else:
+    def __init__(self, reduction="mean", ignore_index=-100, label_smoothing=0.0):
+        if reduction not in ("mean", "sum", "none"):
             raise NotImplementedError(f"Case {reduction} not implemented")
+        self.reduction = reduction
+        self.ignore_index = ignore_index
+        self.label_smoothing = label_smoothing
 
     def __call__(self, input, target):
         return self.forward(input, target)
 
     def forward(self, input, target):
-        if len(target.shape) == 1:
-            target = F.one_hot(target, num_classes=input.shape[-1])
-        sm = F.softmax(input, dim=-1)
-        negative_log = -torch.log(sm)
-        return self.reduction_func(torch.sum(negative_log * target, dim=-1))
+        n_classes = input.shape[-1]
+        if target.shape == input.shape:
+            # class probabilities have to be floating point, e.g. long one-hot targets
+            target = target.to(input.dtype).reshape(-1, n_classes)
+        else:
+            target = target.reshape(-1)
+        # fused log_softmax and nll kernel
+        loss = F.cross_entropy(
+            input.reshape(-1, n_classes),
+            target,
+            reduction=self.reduction,
+            ignore_index=self.ignore_index,
+            label_smoothing=self.label_smoothing,
+        )
+        if self.reduction == "none":
+            return loss.reshape(input.shape[:-1])
+        return loss
@@ -0,0 +1,90 @@
+import torch
+import torch.distributed as dist
+
+from dionysus import constants
+
+
+class ClassificationMetrics:
+    """
+    Accumulates a confusion matrix on the device and computes the metrics of
+    constants.CLASSIFICATION_METRICS like sklearn's classification_report with
+    zero_division=0, i.e. macro averages over the labels present in y_true or
+    y_pred.
+    """
+
+    def __init__(self, num_classes=None):
+        self.num_classes = num_classes
+        self.confusion = None
+
+    def update(self, y_pred, y_true):
+        """
+        y_pred: predicted class labels, i.e. the argmax of the logits
+        y_true: true class labels
+        """
+        if y_pred.is_floating_point():
+            raise ValueError(
+                "y_pred must hold class labels, got floating point scores"
+            )
+        # the size is fixed up front, inferring it from the labels needs a sync
+        if self.num_classes is None:
+            raise ValueError(
+                "number of classes is unknown, pass class_names or multi-class logits"
+            )
+        num_classes = self.num_classes
+        y_pred = y_pred.flatten().long()
+        y_true = y_true.flatten().long()
+
+        if self.confusion is None:
+            self.confusion = torch.zeros(
+                (num_classes, num_classes), dtype=torch.long, device=y_true.device
+            )
+
+        # labels outside [0, num_classes), e.g. an ignore_index, are not counted
+        valid = (y_true >= 0) & (y_true < num_classes)
+        valid &= (y_pred >= 0) & (y_pred < num_classes)
+        index = torch.where(valid, y_true * num_classes + y_pred, 0)
+        # unlike bincount, index_add_ does not sync to size its output
+        self.confusion.view(-1).index_add_(0, index, valid.long())
+
+    def compute(self):
+        if self.confusion is None:
+            return {name: float("nan") for name in constants.CLASSIFICATION_METRICS}
+
+        confusion = self.confusion.double()
+        true_positives = confusion.diag()
+        support = confusion.sum(dim=1)
+        predicted = confusion.sum(dim=0)
+        present = (support + predicted) > 0
+
+        precision = torch.where(predicted > 0, true_positives / predicted, 0.0)
+        recall = torch.where(support > 0, true_positives / support, 0.0)
+        f1score = torch.where(
+            precision + recall > 0,
+            2 * precision * recall / (precision + recall),
+            0.0,
+        )
+        accuracy = true_positives.sum() / confusion.sum()
+
+        values = torch.stack(
+            [
+                accuracy,
+                recall[present].mean(),
+                precision[present].mean(),
+                f1score[present].mean(),
+            ]
+        ).tolist()
+        return dict(zip(constants.CLASSIFICATION_METRICS, values))
+
+    def all_reduce(self, device):
+        """
+        Sums the confusion matrices of all processes of the default group.
+        """
+        if self.confusion is None:
+            self.confusion = torch.zeros(
+                (self.num_classes, self.num_classes), dtype=torch.long, device=device
+            )
+        dist.all_reduce(self.confusion)
+
+    def reset(self):
+        # a fresh allocation instead of zero_(), the matrix might be an inference tensor
+        self.confusion = None
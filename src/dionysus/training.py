@@ -1,17 +1,16 @@
 import time
+from contextlib import nullcontext
 from tqdm.autonotebook import tqdm
 import os
 from pathlib import Path
 import datetime
 import logging
 
-import numpy as np
 import pandas as pd
 import torch
-from torch.utils.data import DataLoader
-from sklearn.metrics import (
-    classification_report,
-)
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler, IterableDataset
 from dataclasses import dataclass
 
 from dionysus.utils import (
@@ -21,6 +20,8 @@ from dionysus.utils import (
     time_pipeline,
 )
 from dionysus import constants
+from dionysus import data
+from dionysus import metrics
 from dionysus import utils
 from dionysus import loss
 
@@ -45,14 +46,46 @@ class TrainingConfig:
     classification_metrics: dict = False
     class_names: list = None
     progress_bar: bool = True
+    progress_bar_granularity: str = "epoch"  # "epoch" or "batch"
     checkpoint_step: int = None  # save every checkpoint_step epoch
     checkpoint_step_batch: int = None  # save every checkpoint_step_batch batch
     checkpoint_path: str = None #  to continue training 
     batch_to_continue: int = None # batch to continue training 
     results: dict = None
+    use_amp: bool = False  # mixed precision training, bfloat16 only on cpu
+    amp_dtype: any = torch.float16
+    cudnn_benchmark: bool = True  # disable for deterministic runs
+    compile_model: bool = False
+    compile_mode: str = "default"  # e.g. "reduce-overhead" or "max-autotune"
+    preload_to_device: bool = False  # keep small datasets on the device, random transforms run only once
+    preload_max_bytes: int = 1024**3
+    ddp: bool = False  # launch with torchrun and use a DistributedSampler
+    local_rank: int = None  # defaults to LOCAL_RANK set by torchrun
+    world_size: int = None  # defaults to WORLD_SIZE set by torchrun
+    grad_accum_steps: int = 1  # optimizer step every grad_accum_steps batches
+    channels_last: bool = False  # NHWC memory format for conv models
 
 
     def __post_init__(self):
+        if self.grad_accum_steps < 1:
+            raise ValueError(
+                f"grad_accum_steps must be at least 1, got {self.grad_accum_steps}"
+            )
+
+        if self.ddp:
+            if self.local_rank is None:
+                self.local_rank = int(os.environ["LOCAL_RANK"])
+            if self.world_size is None:
+                self.world_size = int(os.environ["WORLD_SIZE"])
+            if not dist.is_initialized():
+                backend = "nccl" if torch.cuda.is_available() else "gloo"
+                dist.init_process_group(backend=backend)
+            if torch.cuda.is_available():
+                torch.cuda.set_device(self.local_rank)
+        else:
+            self.local_rank = 0
+            self.world_size = 1
+
         if self.save_model:
             current_time = datetime.datetime.now()
             timestamp = current_time.strftime("%Y%m%d_%H%M%S")
@@ -72,11 +105,21 @@ class TrainingConfig:
         logging.basicConfig(
             format="%(asctime)s - %(message)s",
             level=logging.INFO,
-            handlers=[logging.FileHandler(logfile, mode="w")],
+            handlers=[
+                logging.FileHandler(logfile, mode="w")
+                if self.is_main_process
+                else logging.NullHandler()
+            ],
             force=self.force_write_logs,
         )
 
-        if self.device == "gpu" or self.device == torch.device("cuda:0"):
+        if self.ddp:
+            if torch.cuda.is_available():
+                self.device = torch.device(f"cuda:{self.local_rank}")
+            else:
+                self.device = torch.device("cpu")
+            logging.info(f"using device {self.device}, world size {self.world_size}")
+        elif self.device == "gpu" or self.device == torch.device("cuda:0"):
             self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
             logging.info(f"using device {self.device}")
         elif self.device == "cpu" or torch.device("cpu"):
@@ -85,6 +128,32 @@ class TrainingConfig:
         else:
             logging.info(f"device {self.device} is not available, using cpu instead")
 
+        if self.device.type == "cuda":
+            torch.set_float32_matmul_precision("high")
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cudnn.benchmark = self.cudnn_benchmark
+            logging.info(
+                f"using float32 matmul precision {torch.get_float32_matmul_precision()}"
+            )
+
+        if self.classification_metrics:
+            num_classes = len(self.class_names) if self.class_names else None
+            self.training_metrics = metrics.ClassificationMetrics(num_classes)
+            self.validation_metrics = metrics.ClassificationMetrics(num_classes)
+
+        if (
+            self.use_amp
+            and self.device.type == "cpu"
+            and self.amp_dtype != torch.bfloat16
+        ):
+            raise ValueError(
+                f"amp_dtype {self.amp_dtype} is not supported on cpu, use torch.bfloat16"
+            )
+        # loss scaling is only needed for float16 gradients on cuda
+        self.scaler = torch.cuda.amp.GradScaler(
+            enabled=self.use_amp and self.device.type == "cuda"
+        )
 
         # TODO also enable to continue training for a given epoch. this is for huge datasets that are only trained on one epoch
         if self.checkpoint_path:
@@ -98,6 +167,9 @@ class TrainingConfig:
                 self.optimizer = torch.optim.AdamW(self.model.parameters(), lr=self.lr)
 
             self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+            # empty if the checkpoint was saved without amp
+            if checkpoint.get('scaler_state_dict'):
+                self.scaler.load_state_dict(checkpoint['scaler_state_dict'])
             self.epoch_to_continue = checkpoint['epoch']
             self.batch_to_continue = checkpoint['batch']
             self.results = checkpoint['results']
@@ -110,6 +182,20 @@ class TrainingConfig:
             elif self.optimizer == "AdamW":
                 self.optimizer = torch.optim.AdamW(self.model.parameters(), lr=self.lr)
 
+        if self.channels_last:
+            self.model.to(memory_format=torch.channels_last)
+
+        if self.ddp:
+            self.model = DistributedDataParallel(
+                self.model,
+                device_ids=[self.local_rank] if self.device.type == "cuda" else None,
+                bucket_cap_mb=25,
+                gradient_as_bucket_view=True,
+            )
+
+    @property
+    def is_main_process(self):
+        return not self.ddp or dist.get_rank() == 0
 
     def loss(self, x, y):
         y_hat = self.model(x)
@@ -155,17 +241,37 @@ def _setup_results(config):
 def train(config: TrainingConfig):
     results = _setup_results(config)
     time_training = 0
+    # only the model is compiled, loss_func stays eager
+    if config.compile_model and not hasattr(config.model, "_orig_mod"):
+        config.model = torch.compile(
+            config.model, mode=config.compile_mode, dynamic=False
+        )
+    if config.preload_to_device:
+        config.training_loader = data.preload(
+            config.training_loader, config.device, config.preload_max_bytes
+        )
+        if config.validation_loader is not None:
+            config.validation_loader = data.preload(
+                config.validation_loader, config.device, config.preload_max_bytes
+            )
     logging.info("starting training")
     for epoch in tqdm(
-        range(config.epoch_to_continue, config.epoch_to_continue + config.epochs), desc="epoch", disable=not config.progress_bar
+        range(config.epoch_to_continue, config.epoch_to_continue + config.epochs),
+        desc="epoch",
+        disable=not config.progress_bar or not config.is_main_process,
     ):
-        config.model = config.model.train()
+        for data_loader in (config.training_loader, config.validation_loader):
+            sampler = getattr(data_loader, "sampler", None)
+            if isinstance(sampler, DistributedSampler):
+                sampler.set_epoch(epoch)
+
+        config.model.train()
         epoch_time, _ = run_epoch(config, results, epoch, prefix="training")
         time_training += epoch_time
 
         if config.validation_loader is not None:
-            config.model = config.model.eval()
-            with torch.no_grad():
+            config.model.eval()
+            with torch.inference_mode():
                 _, validation_result = run_epoch(
                     config, results, epoch, prefix="validation"
                 )
@@ -173,10 +279,14 @@ def train(config: TrainingConfig):
         results["epoch"].append(epoch + 1)
         results["epoch_time"].append(epoch_time)
 
-        if config.checkpoint_step is not None and epoch % config.checkpoint_step == 0:
+        if (
+            config.checkpoint_step is not None
+            and epoch % config.checkpoint_step == 0
+            and config.is_main_process
+        ):
             save_checkpoint("last", config, results, validation_result)
 
-    if config.save_model:
+    if config.save_model and config.is_main_process:
         save_checkpoint("last", config, results, validation_result)
 
     logging.info(f"finished training, took {(time_training / 60 / 60):.3f} hours")
@@ -190,63 +300,187 @@ def train(config: TrainingConfig):
     logging.info(f"results:\n {pd.DataFrame.from_dict(results)}")
 
 
+def _num_batches(data_loader):
+    """
+    Number of batches, None if unknown or only an estimate like for an
+    IterableDataset.
+    """
+    if isinstance(getattr(data_loader, "dataset", None), IterableDataset):
+        return None
+    try:
+        return len(data_loader)
+    except TypeError:
+        return None
+
+
+def _is_logits(y_hat):
+    return y_hat.ndim == 2 and y_hat.shape[1] > 1
+
+
+def _predicted_labels(y_hat):
+    """
+    Reduces multi-class outputs to int64 labels on the device, so only N
+    labels instead of N x C scores are accumulated and copied to the host.
+    """
+    y_hat = y_hat.detach()
+    if _is_logits(y_hat):
+        return y_hat.argmax(dim=1).to(torch.int64)
+    return y_hat
+
+
+def _train_step(config: TrainingConfig, x, y, sync_gradients, n_accumulate):
+    # skip the DDP allreduce for all but the last micro step
+    if config.ddp and not sync_gradients:
+        sync_context = config.model.no_sync()
+    else:
+        sync_context = nullcontext()
+
+    with sync_context:
+        with torch.autocast(
+            device_type=config.device.type,
+            dtype=config.amp_dtype,
+            enabled=config.use_amp,
+        ):
+            loss, y_hat = config.loss(x, y)
+        config.scaler.scale(loss / n_accumulate).backward()
+
+    if sync_gradients:
+        config.scaler.step(config.optimizer)
+        config.scaler.update()
+        config.optimizer.zero_grad(set_to_none=True)
+
+    return loss, y_hat
+
+
+def _eval_step(config: TrainingConfig, x, y, sync_gradients, n_accumulate):
+    # validation runs without autocast
+    return config.loss(x, y)
+
+
 def run_epoch(config: TrainingConfig, results: dict, epoch, prefix=""):
     if prefix == "training":
         data_loader = config.training_loader
     if prefix == "validation":
         data_loader = config.validation_loader
-    running_loss = []
-    y_true = []
-    y_pred = []
+    device = config.device
+    n_total = _num_batches(data_loader)
+    if device.type == "cuda" and not isinstance(data_loader, data.DeviceLoader):
+        data_loader = data.CUDAPrefetcher(data_loader, device)
+
+    # loop invariants, resolved once per epoch instead of once per batch
+    step = _train_step if config.model.training else _eval_step
+    compute_metrics = bool(config.classification_metrics)
+    if compute_metrics:
+        classification_metrics = getattr(config, prefix + "_metrics")
+    keep_predictions = compute_metrics and prefix == "validation"
+    batch_to_continue = config.batch_to_continue
+    checkpoint_step_batch = config.checkpoint_step_batch
+    grad_accum_steps = config.grad_accum_steps
+    channels_last = config.channels_last
+
+    running_loss = torch.empty(n_total or 64, device=device)
+    n_batches = 0
+    y_true_chunks = []
+    y_pred_chunks = []
+    if (
+        config.progress_bar
+        and config.progress_bar_granularity == "batch"
+        and config.is_main_process
+    ):
+        n_updates = max(1, (n_total or 0) // 100)
+        data_loader = tqdm(
+            data_loader,
+            desc="batch",
+            total=n_total,
+            leave=False,
+            mininterval=1.0,
+            miniters=n_updates,
+        )
+
     start = time.time()
     batch = 1
-    for x, y in tqdm(
-        data_loader, desc="batch", leave=False, disable=not config.progress_bar
-    ):
-        if config.batch_to_continue and batch < config.batch_to_continue:
+    for x, y in data_loader:
+        if batch_to_continue and batch < batch_to_continue:
             batch += 1
             continue
         
-        x = utils.moveTo(x, config.device)
-        y = utils.moveTo(y, config.device)
-
-        loss, y_hat = config.loss(x, y)
-
-        if config.model.training:
-            loss.backward()
-            config.optimizer.step()
-            config.optimizer.zero_grad()
-
-        running_loss.append(loss.item())
-
-        if config.classification_metrics and isinstance(y, torch.Tensor):
-            labels = y.detach().cpu().numpy()
-            y_hat = y_hat.detach().cpu().numpy()
-            y_true.extend(labels.tolist())
-            y_pred.extend(y_hat.tolist())
-
-        if config.checkpoint_step_batch is not None and batch % config.checkpoint_step_batch == 0:
+        if getattr(x, "device", None) != device:
+            x = utils.moveTo(x, device, non_blocking=True)
+        if getattr(y, "device", None) != device:
+            y = utils.moveTo(y, device, non_blocking=True)
+        if channels_last and isinstance(x, torch.Tensor) and x.ndim == 4:
+            x = x.contiguous(memory_format=torch.channels_last)
+
+        sync_gradients = batch % grad_accum_steps == 0 or batch == n_total
+        # the last group of an epoch can have less than grad_accum_steps batches
+        n_accumulate = grad_accum_steps
+        if n_total is not None:
+            group_start = (batch - 1) // grad_accum_steps * grad_accum_steps
+            n_accumulate = min(grad_accum_steps, n_total - group_start)
+        loss, y_hat = step(config, x, y, sync_gradients, n_accumulate)
+
+        if n_batches == len(running_loss):
+            running_loss = torch.cat([running_loss, torch.empty_like(running_loss)])
+        running_loss[n_batches] = loss.detach()
+        n_batches += 1
+
+        if compute_metrics and isinstance(y, torch.Tensor):
+            if classification_metrics.num_classes is None and _is_logits(y_hat):
+                classification_metrics.num_classes = y_hat.shape[1]
+            y_pred = _predicted_labels(y_hat)
+            y = y.detach()
+            classification_metrics.update(y_pred, y)
+            # labels and predictions are only kept for the validation report
+            if keep_predictions:
+                y_pred_chunks.append(y_pred)
+                y_true_chunks.append(y)
+
+        if (
+            checkpoint_step_batch is not None
+            and batch % checkpoint_step_batch == 0
+            and config.is_main_process
+        ):
             save_checkpoint_batch(batch, config)
 
         batch += 1
         
     end = time.time()
 
-    y_pred = np.asarray(y_pred)
-    if len(y_pred.shape) == 2 and y_pred.shape[1] > 1:
-        y_pred = np.argmax(y_pred, axis=1)
-
-    if config.classification_metrics:
-        report_dict = classification_report(
-            y_true, y_pred, output_dict=True, zero_division=0
-        )
-        macro_dict = report_dict["macro avg"]
-        results[prefix + "_accuracy"].append(report_dict["accuracy"])
-        results[prefix + "_macro_recall"].append(macro_dict["recall"])
-        results[prefix + "_macro_precision"].append(macro_dict["precision"])
-        results[prefix + "_macro_f1score"].append(macro_dict["f1-score"])
-
-    results[prefix + "_loss"].append(np.mean(running_loss))
+    if step is _train_step and n_batches and not sync_gradients:
+        # only possible if the number of batches is unknown
+        config.optimizer.zero_grad(set_to_none=True)
+        logging.info("dropped gradients of the incomplete last accumulation group")
+
+    if keep_predictions:
+        y_true = torch.cat(y_true_chunks).cpu() if y_true_chunks else torch.empty(0)
+        y_pred = torch.cat(y_pred_chunks).cpu() if y_pred_chunks else torch.empty(0)
+        if config.ddp:
+            # the validation report covers the shards of all ranks
+            shards = [None] * dist.get_world_size()
+            dist.all_gather_object(shards, (y_true, y_pred))
+            y_true = torch.cat([shard[0] for shard in shards])
+            y_pred = torch.cat([shard[1] for shard in shards])
+        y_true, y_pred = y_true.numpy(), y_pred.numpy()
+    else:
+        y_true, y_pred = [], []
+
+    loss_sum = running_loss[:n_batches].sum()
+    n_batches = torch.tensor(n_batches, dtype=loss_sum.dtype, device=device)
+    if config.ddp:
+        # every rank only saw its shard of the data
+        dist.all_reduce(loss_sum)
+        dist.all_reduce(n_batches)
+        if compute_metrics:
+            classification_metrics.all_reduce(device)
+
+    if compute_metrics:
+        metric_values = classification_metrics.compute()
+        classification_metrics.reset()
+        for name, value in metric_values.items():
+            results[prefix + "_" + name].append(value)
+
+    # single device to host sync per epoch
+    results[prefix + "_loss"].append((loss_sum / n_batches).item())
     time_elapsed = end - start
     if not config.progress_bar:
         if prefix == "training":
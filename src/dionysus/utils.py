@@ -15,6 +15,7 @@ from dionysus import constants
 
 import pandas as pd
 import torch
+from torch.nn.parallel import DistributedDataParallel
 
 
 import logging
@@ -32,28 +33,42 @@ def tar_folder(config):
         tar.add(path, arcname=os.path.basename(path))
 
 
-def moveTo(obj, device):
+def moveTo(obj, device, non_blocking=None):
     """
     obj: the python object to move to a device, or to move its contents to a device
     device: the compute device to move objects to
+    non_blocking: asynchronous copy, defaults to True for cuda devices. Only overlaps with compute for pinned memory.
     """
+    if non_blocking is None:
+        non_blocking = torch.device(device).type == "cuda"
     if hasattr(obj, "to"):
-        return obj.to(device)
+        return obj.to(device, non_blocking=non_blocking)
     elif isinstance(obj, list):
-        return [moveTo(x, device) for x in obj]
+        return [moveTo(x, device, non_blocking) for x in obj]
     elif isinstance(obj, tuple):
-        return tuple(moveTo(list(obj), device))
+        return tuple(moveTo(list(obj), device, non_blocking))
     elif isinstance(obj, set):
-        return set(moveTo(list(obj), device))
+        return set(moveTo(list(obj), device, non_blocking))
     elif isinstance(obj, dict):
         to_ret = dict()
         for key, value in obj.items():
-            to_ret[moveTo(key, device)] = moveTo(value, device)
+            to_ret[moveTo(key, device, non_blocking)] = moveTo(value, device, non_blocking)
         return to_ret
     else:
         return obj
 
 
+def unwrap_model(model):
+    """
+    Returns the underlying model of torch.compile and DistributedDataParallel
+    wrappers, the state dicts of the wrappers have prefixed keys.
+    """
+    model = getattr(model, "_orig_mod", model)
+    if isinstance(model, DistributedDataParallel):
+        model = model.module
+    return model
+
+
 def save_checkpoint_batch(batch, config):
     """
     Save only model.
@@ -64,8 +79,9 @@ def save_checkpoint_batch(batch, config):
     torch.save(
         {
             "batch": batch,
-            "model_state_dict": config.model.state_dict(),
-            "optimizer_state_dict": config.optimizer.state_dict()
+            "model_state_dict": unwrap_model(config.model).state_dict(),
+            "optimizer_state_dict": config.optimizer.state_dict(),
+            "scaler_state_dict": config.scaler.state_dict(),
         },
         os.path.join(save_path, constants.CHECKPOINT_FILE),
     )
@@ -83,8 +99,9 @@ def save_checkpoint(epoch, config, results, validation_result):
         {
             "epoch": results['epoch'][-1],
             "batch": 1,
-            "model_state_dict": config.model.state_dict(),
+            "model_state_dict": unwrap_model(config.model).state_dict(),
             "optimizer_state_dict": config.optimizer.state_dict(),
+            "scaler_state_dict": config.scaler.state_dict(),
             "results": results_pd,
             "validation_result": validation_result,
         },
@@ -121,7 +138,7 @@ def time_pipeline(config, runs=100, warmup_runs=10):
 
 
 def compute_size(model):
-    state_dict = model.state_dict()
+    state_dict = unwrap_model(model).state_dict()
     with tempfile.TemporaryDirectory() as tempdir:
         tmp_path = Path(tempdir).joinpath("model.pt")
         torch.save(state_dict, tmp_path)
@@ -0,0 +1,82 @@
+import torch
+from torch.nn.utils.rnn import pad_sequence
+from torch.utils.data import (
+    TensorDataset,
+    DataLoader,
+    DistributedSampler,
+    RandomSampler,
+    SubsetRandomSampler,
+    WeightedRandomSampler,
+)
+
+from dionysus.data import DeviceLoader, preload
+
+
+def test_preload():
+    X = torch.randn(10, 3)
+    y = torch.arange(10)
+    data_loader = DataLoader(TensorDataset(X, y), batch_size=4)
+
+    device_loader = preload(data_loader, torch.device("cpu"), max_bytes=1024**2)
+
+    assert isinstance(device_loader, DeviceLoader)
+    assert len(device_loader) == len(data_loader)
+    for (x_expected, y_expected), (x_actual, y_actual) in zip(
+        data_loader, device_loader
+    ):
+        assert torch.equal(x_expected, x_actual)
+        assert torch.equal(y_expected, y_actual)
+
+
+def test_preload_exceeds_max_bytes():
+    X = torch.randn(10, 3)
+    y = torch.arange(10)
+    data_loader = DataLoader(TensorDataset(X, y), batch_size=4)
+
+    assert preload(data_loader, torch.device("cpu"), max_bytes=16) is data_loader
+
+
+def test_preload_padded_batches():
+    sequences = [torch.ones(length) for length in range(1, 9)]
+    labels = torch.arange(8)
+
+    def pad_collate(batch):
+        x = pad_sequence([sample[0] for sample in batch], batch_first=True)
+        y = torch.stack([sample[1] for sample in batch])
+        return x, y
+
+    data_loader = DataLoader(
+        list(zip(sequences, labels)), batch_size=4, collate_fn=pad_collate
+    )
+
+    assert preload(data_loader, torch.device("cpu"), max_bytes=1024**2) is data_loader
+
+
+def test_device_loader_shuffle_drop_last():
+    X = torch.arange(10).unsqueeze(1)
+    y = torch.arange(10)
+    device_loader = DeviceLoader(X, y, batch_size=4, shuffle=True, drop_last=True)
+
+    batches = list(device_loader)
+
+    assert len(batches) == len(device_loader) == 2
+    for x, y in batches:
+        assert x.shape == (4, 1)
+        assert torch.equal(x.squeeze(1), y)
+
+
+def test_preload_unsupported_sampler():
+    X = torch.randn(10, 3)
+    y = torch.arange(10)
+    dataset = TensorDataset(X, y)
+    samplers = [
+        WeightedRandomSampler(torch.ones(10), num_samples=10),
+        SubsetRandomSampler(range(5)),
+        RandomSampler(dataset, replacement=True),
+        RandomSampler(dataset, num_samples=5),
+        DistributedSampler(dataset, num_replicas=2, rank=0),
+    ]
+
+    for sampler in samplers:
+        data_loader = DataLoader(dataset, batch_size=4, sampler=sampler)
+        assert preload(data_loader, torch.device("cpu"), max_bytes=1024**2) is data_loader
@@ -78,3 +78,47 @@ def test_custom_class_cross_entropy_loss_int(reduction):
     loss_actual = loss_func(input, target)
 
     assert torch.abs(loss_expected - loss_actual) < eps()
+
+
+def test_custom_class_cross_entropy_loss_sequence():
+    torch.manual_seed(0)
+    input = torch.randn(2, 4, 5, requires_grad=True)
+    target = torch.randint(5, (2, 4), dtype=torch.int64)
+    target[0, 3] = -100
+
+    loss_func_torch = nn.CrossEntropyLoss(ignore_index=-100)
+    loss_expected = loss_func_torch(input.view(-1, 5), target.view(-1))
+
+    loss_func = loss.CrossEntropyLoss(ignore_index=-100)
+    loss_actual = loss_func(input, target)
+
+    assert torch.abs(loss_expected - loss_actual) < eps()
+
+
+@pytest.mark.parametrize("reduction", [("mean"), ("sum"), ("none")])
+def test_custom_class_cross_entropy_loss_one_hot_long(reduction):
+    torch.manual_seed(0)
+    input = torch.randn(3, 5, requires_grad=True)
+    target = torch.randint(5, (3,), dtype=torch.int64)
+
+    loss_func_torch = nn.CrossEntropyLoss(reduction=reduction)
+    loss_expected = loss_func_torch(input, target)
+
+    loss_func = loss.CrossEntropyLoss(reduction=reduction)
+    loss_actual = loss_func(input, F.one_hot(target, num_classes=5))
+
+    assert loss_actual.shape == loss_expected.shape
+    assert torch.all(torch.abs(loss_expected - loss_actual) < 1e-6)
+
+
+def test_custom_class_cross_entropy_loss_sequence_no_reduction():
+    torch.manual_seed(0)
+    input = torch.randn(2, 4, 5)
+    target = torch.randint(5, (2, 4), dtype=torch.int64)
+
+    loss_func = loss.CrossEntropyLoss(reduction="none")
+    loss_actual = loss_func(input, target)
+
+    loss_expected = F.cross_entropy(input.transpose(1, 2), target, reduction="none")
+    assert loss_actual.shape == (2, 4)
+    assert torch.all(torch.abs(loss_expected - loss_actual) < 1e-6)
@@ -0,0 +1,54 @@
+import pytest
+
+import torch
+from sklearn.metrics import classification_report
+
+from dionysus.metrics import ClassificationMetrics
+
+
+def test_classification_metrics():
+    torch.manual_seed(0)
+    y_true = torch.randint(3, (50,))
+    y_pred = torch.randint(4, (50,))
+
+    report_dict = classification_report(
+        y_true.numpy(), y_pred.numpy(), output_dict=True, zero_division=0
+    )
+    macro_dict = report_dict["macro avg"]
+
+    classification_metrics = ClassificationMetrics(num_classes=4)
+    for y_pred_batch, y_true_batch in zip(y_pred.split(16), y_true.split(16)):
+        classification_metrics.update(y_pred_batch, y_true_batch)
+    metric_values = classification_metrics.compute()
+
+    assert metric_values["accuracy"] == pytest.approx(report_dict["accuracy"])
+    assert metric_values["macro_recall"] == pytest.approx(macro_dict["recall"])
+    assert metric_values["macro_precision"] == pytest.approx(macro_dict["precision"])
+    assert metric_values["macro_f1score"] == pytest.approx(macro_dict["f1-score"])
+
+    classification_metrics.reset()
+    assert classification_metrics.confusion is None
+
+
+def test_classification_metrics_float_predictions():
+    classification_metrics = ClassificationMetrics(num_classes=2)
+    with pytest.raises(ValueError):
+        classification_metrics.update(torch.rand(8, 1), torch.randint(2, (8,)))
+
+
+def test_classification_metrics_unknown_num_classes():
+    classification_metrics = ClassificationMetrics()
+    with pytest.raises(ValueError):
+        classification_metrics.update(torch.randint(2, (8,)), torch.randint(2, (8,)))
+
+
+def test_classification_metrics_out_of_range_labels():
+    y_true = torch.tensor([0, 1, -100, 3, 1])
+    y_pred = torch.tensor([0, 1, 1, 1, 0])
+
+    classification_metrics = ClassificationMetrics(num_classes=2)
+    classification_metrics.update(y_pred, y_true)
+
+    assert torch.equal(
+        classification_metrics.confusion, torch.tensor([[1, 0], [1, 1]])
+    )
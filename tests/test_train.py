@@ -1,17 +1,217 @@
 import unittest
+from unittest import mock
 import os
 from pathlib import Path
+import socket
 import tempfile
-from torch.utils.data import TensorDataset, DataLoader
+from torch.utils.data import (
+    TensorDataset,
+    DataLoader,
+    DistributedSampler,
+    IterableDataset,
+)
 from sklearn.datasets import make_classification
+from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn as nn
 
-from dionysus.training import train, TrainingConfig, DistillConfig
+from dionysus.architectures import LeNet5
+from dionysus.training import train, run_epoch, TrainingConfig, DistillConfig
+
+
+class BatchStream(IterableDataset):
+    """
+    Iterable dataset without __len__.
+    """
+
+    def __init__(self, X, y):
+        self.X = X
+        self.y = y
+
+    def __iter__(self):
+        return iter(zip(self.X, self.y))
+
+
+def ddp_validation_worker(rank, world_size, log_dir):
+    os.environ["RANK"] = str(rank)
+    os.environ["LOCAL_RANK"] = str(rank)
+    os.environ["WORLD_SIZE"] = str(world_size)
+    os.chdir(log_dir)
+
+    torch.manual_seed(0)
+    X = torch.randn(16, 4)
+    y = torch.randint(3, (16,))
+    model = nn.Linear(4, 3)
+    dataset = TensorDataset(X, y)
+    # equal batch sizes, so the mean of the batch losses is the global mean
+    validation_loader = DataLoader(
+        dataset,
+        batch_size=2,
+        sampler=DistributedSampler(dataset, shuffle=False),
+    )
+
+    config = TrainingConfig(
+        model=model,
+        loss_func=nn.CrossEntropyLoss(),
+        training_loader=validation_loader,
+        validation_loader=validation_loader,
+        classification_metrics=True,
+        class_names=["A", "B", "C"],
+        progress_bar=False,
+        ddp=True,
+    )
+    assert config.device == torch.device("cpu")
+
+    results = {"validation_loss": [], "validation_accuracy": []}
+    for name in ["macro_recall", "macro_precision", "macro_f1score"]:
+        results["validation_" + name] = []
+    config.model.eval()
+    with torch.inference_mode():
+        _, validation_result = run_epoch(config, results, 0, prefix="validation")
+        logits = model(X)
+
+    loss_expected = nn.CrossEntropyLoss()(logits, y).item()
+    accuracy_expected = accuracy_score(y.numpy(), logits.argmax(dim=1).numpy())
+    assert abs(results["validation_loss"][0] - loss_expected) < 1e-6
+    assert abs(results["validation_accuracy"][0] - accuracy_expected) < 1e-6
+
+    # the validation report is built from the predictions of all ranks
+    y_true, y_pred = validation_result
+    assert len(y_true) == len(y_pred) == 16
+    assert abs(accuracy_score(y_true, y_pred) - accuracy_expected) < 1e-6
+
+    dist.destroy_process_group()
 
 
 class Test(unittest.TestCase):
+    def test_gradient_accumulation(self):
+        torch.manual_seed(0)
+        # 10 samples, the last accumulation group only has a single batch
+        dataset = TensorDataset(torch.randn(10, 4), torch.randint(3, (10,)))
+        initial_state_dict = nn.Linear(4, 3).state_dict()
+
+        parameters = []
+        for batch_size, grad_accum_steps in [(2, 2), (4, 1)]:
+            model = nn.Linear(4, 3)
+            model.load_state_dict(initial_state_dict)
+            config = TrainingConfig(
+                model=model,
+                loss_func=nn.CrossEntropyLoss(),
+                training_loader=DataLoader(dataset, batch_size=batch_size),
+                lr=0.1,
+                progress_bar=False,
+                grad_accum_steps=grad_accum_steps,
+            )
+            config.model.train()
+            run_epoch(config, {"training_loss": []}, 0, prefix="training")
+            parameters.append(model.weight.detach().clone())
+
+        assert torch.allclose(parameters[0], parameters[1], atol=1e-6)
+
+    def test_training_loss_iterable_dataset(self):
+        torch.manual_seed(0)
+        X = torch.randn(150, 4)
+        y = torch.randint(3, (150,))
+        model = nn.Linear(4, 3)
+        # more batches than the initial loss buffer holds
+        data_loader = DataLoader(BatchStream(X, y), batch_size=1)
+        config = TrainingConfig(
+            model=model,
+            loss_func=nn.CrossEntropyLoss(),
+            training_loader=data_loader,
+            validation_loader=data_loader,
+            progress_bar=False,
+        )
+
+        results = {"validation_loss": []}
+        config.model.eval()
+        with torch.inference_mode():
+            run_epoch(config, results, 0, prefix="validation")
+            loss_expected = nn.CrossEntropyLoss()(model(X), y).item()
+
+        assert abs(results["validation_loss"][0] - loss_expected) < 1e-5
+
+    def test_amp_bfloat16_cpu(self):
+        torch.manual_seed(0)
+        dataset = TensorDataset(torch.randn(32, 4), torch.randint(3, (32,)))
+        model = nn.Linear(4, 3)
+        initial_weight = model.weight.detach().clone()
+        config = TrainingConfig(
+            model=model,
+            loss_func=nn.CrossEntropyLoss(),
+            training_loader=DataLoader(dataset, batch_size=8),
+            lr=0.1,
+            progress_bar=False,
+            use_amp=True,
+            amp_dtype=torch.bfloat16,
+        )
+        assert not config.scaler.is_enabled()
+
+        results = {"training_loss": []}
+        config.model.train()
+        run_epoch(config, results, 0, prefix="training")
+
+        assert torch.isfinite(torch.tensor(results["training_loss"][0]))
+        assert not torch.equal(model.weight, initial_weight)
+        assert model.weight.dtype == torch.float32
+
+    def test_amp_float16_cpu(self):
+        with self.assertRaises(ValueError):
+            TrainingConfig(
+                model=nn.Linear(4, 3),
+                loss_func=nn.CrossEntropyLoss(),
+                training_loader=None,
+                use_amp=True,
+            )
+
+    def test_channels_last(self):
+        torch.manual_seed(0)
+        dataset = TensorDataset(torch.randn(16, 1, 28, 28), torch.randint(10, (16,)))
+        initial_state_dict = LeNet5().state_dict()
+
+        losses = []
+        for channels_last in [False, True]:
+            model = LeNet5()
+            model.load_state_dict(initial_state_dict)
+            config = TrainingConfig(
+                model=model,
+                loss_func=nn.CrossEntropyLoss(),
+                training_loader=DataLoader(dataset, batch_size=8),
+                lr=0.1,
+                progress_bar=False,
+                channels_last=channels_last,
+            )
+            results = {"training_loss": []}
+            config.model.train()
+            run_epoch(config, results, 0, prefix="training")
+            losses.append(results["training_loss"][0])
+
+        assert model.conv2.weight.is_contiguous(memory_format=torch.channels_last)
+        assert torch.isfinite(torch.tensor(losses[1]))
+        assert abs(losses[0] - losses[1]) < 1e-5
+
+    def test_invalid_grad_accum_steps(self):
+        with self.assertRaises(ValueError):
+            TrainingConfig(
+                model=nn.Linear(4, 3),
+                loss_func=nn.CrossEntropyLoss(),
+                training_loader=None,
+                grad_accum_steps=0,
+            )
+
+    def test_ddp_validation_metrics_are_global(self):
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        environment = {"MASTER_ADDR": "localhost", "MASTER_PORT": str(port)}
+
+        with mock.patch.dict(os.environ, environment):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                mp.spawn(ddp_validation_worker, args=(2, temp_dir), nprocs=2)
+
     def test_training(self):
         with tempfile.TemporaryDirectory() as temp_dir:
             # Test Training
@@ -64,8 +64,16 @@ def get_mnist_datasets():
 
 
 training_dataset, validation_dataset = get_mnist_datasets()
-training_loader = DataLoader(training_dataset, batch_size=512 * 4, shuffle=True)
-validation_loader = DataLoader(validation_dataset, batch_size=512 * 4)
+# pinned memory only pays off when copying to a cuda device
+loader_kwargs = dict(
+    pin_memory=torch.cuda.is_available(), num_workers=2, persistent_workers=True
+)
+# drop_last keeps training batch shapes static for compile_model, avoiding
+# a recompile for the last partial batch of every epoch
+training_loader = DataLoader(
+    training_dataset, batch_size=512 * 4, shuffle=True, drop_last=True, **loader_kwargs
+)
+validation_loader = DataLoader(validation_dataset, batch_size=512 * 4, **loader_kwargs)
 
 model = LeNet5()
 loss_func = nn.CrossEntropyLoss()
@@ -88,6 +96,7 @@ train_config = TrainingConfig(
     save_path=save_path,
     model_name="LeNet-5",
     progress_bar=False,
+    compile_model=True,
     checkpoint_step=5,
 )
 
@@ -118,6 +127,7 @@ distill_config = DistillConfig(
     save_path=save_path,
     model_name="LeNet-5_distilled",
     progress_bar=False,
+    compile_model=True,
     checkpoint_step=2,
     teacher=teacher,
     alpha=0.5,